@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Generic, Hashable, Iterator, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+# Rough per-entry overhead of the OrderedDict node and the (value, expiry) tuple
+ENTRY_OVERHEAD_BYTES = 128
+DEFAULT_MEMORY_BUDGET_BYTES = 16 * 1024 * 1024
+
+_caches: weakref.WeakSet[BoundedCache] = weakref.WeakSet()
+_memory_budget = DEFAULT_MEMORY_BUDGET_BYTES
+_budget_lock = threading.Lock()
+
+
+def _entry_size(key: Hashable, value: object) -> int:
+    return sys.getsizeof(key) + sys.getsizeof(value) + ENTRY_OVERHEAD_BYTES
+
+
+class BoundedCache(Generic[K, V]):
+    """LRU cache with optional TTL that counts towards the process memory budget.
+
+    All long-lived state should go through one of these so that memory stays flat
+    for processes that run for weeks. With `refresh_ttl=False`, updating a key keeps
+    the expiry from when it was first set, so values such as counts reset every
+    `ttl` seconds instead of living as long as they keep being written.
+
+    Caches are safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        refresh_ttl: bool = True,
+    ) -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.refresh_ttl = refresh_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size_bytes = 0
+        self._lock = threading.RLock()
+        self._data: OrderedDict[K, tuple[V, Optional[float], int]] = OrderedDict()
+        _caches.add(self)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: object) -> bool:
+        # Membership counts as a use, so caches only read with `in` stay LRU
+        sentinel = object()
+        return self.get(key, sentinel) is not sentinel  # type: ignore
+
+    def __iter__(self) -> Iterator[K]:
+        with self._lock:
+            return iter(list(self._data))
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: K, value: V) -> None:
+        with self._lock:
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            if key in self._data:
+                previous = self._data[key][1]
+                expired = previous is not None and previous <= time.monotonic()
+                if not self.refresh_ttl and not expired:
+                    expires_at = previous
+                self._remove(key)
+            size = _entry_size(key, value)
+            self._data[key] = (value, expires_at, size)
+            self.size_bytes += size
+            if self.max_entries is not None:
+                while len(self._data) > self.max_entries:
+                    self.evict_oldest()
+        # Outside our own lock, as enforcing the budget takes other caches' locks
+        enforce_memory_budget()
+
+    def evict_oldest(self) -> None:
+        with self._lock:
+            if not self._data:
+                return
+            key = next(iter(self._data))
+            self._remove(key)
+            self.evictions += 1
+
+    def purge_expired(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            expired = [
+                key
+                for key, (_, expires_at, _) in self._data.items()
+                if expires_at is not None and expires_at <= now
+            ]
+            for key in expired:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self.size_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: K) -> None:
+        # Callers must hold self._lock
+        _, _, size = self._data.pop(key)
+        self.size_bytes -= size
+
+
+def set_memory_budget(budget_bytes: int) -> None:
+    global _memory_budget
+    if budget_bytes < 1:
+        raise ValueError("Memory budget must be greater than 0.")
+    _memory_budget = budget_bytes
+    enforce_memory_budget()
+
+
+def get_memory_budget() -> int:
+    return _memory_budget
+
+
+def total_size_bytes() -> int:
+    return sum(cache.size_bytes for cache in _caches)
+
+
+def enforce_memory_budget() -> None:
+    """Evict least recently used entries, largest cache first, until under budget."""
+    if total_size_bytes() <= _memory_budget:
+        return
+    with _budget_lock:
+        caches = list(_caches)
+        for cache in caches:
+            cache.purge_expired()
+        while total_size_bytes() > _memory_budget:
+            largest = max(caches, key=lambda x: x.size_bytes)
+            if not len(largest):
+                break
+            largest.evict_oldest()
+
+
+def get_cache_stats() -> dict[str, dict[str, int]]:
+    caches = sorted(_caches, key=lambda x: x.name)
+    stats = {cache.name: cache.stats() for cache in caches}
+    stats["total"] = {"bytes": total_size_bytes(), "budget": _memory_budget}
+    return stats
+
+
+def create_stats_string() -> str:
+    lines = [
+        f"{name}: " + ", ".join(f"{k}={v}" for k, v in values.items())
+        for name, values in get_cache_stats().items()
+    ]
+    return "\n".join(lines)
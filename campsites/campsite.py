@@ -1,10 +1,38 @@
 from __future__ import annotations
 
-import itertools
-from dataclasses import dataclass
-from datetime import datetime, timedelta
+import functools
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
 from typing import List, Optional
 
+WEEKDAYS = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
+
+# The same few hundred date strings repeat across every site in a campground. A
+# plain lru_cache keeps lookups cheaper than the parse they replace.
+@functools.lru_cache(maxsize=4_096)
+def date_string_to_day(date_string: str) -> int:
+    """Convert an ISO date string (optionally with a time part) to a day ordinal."""
+    return date.fromisoformat(date_string[:10]).toordinal()
+
+
+def day_to_datetime(day: int) -> datetime:
+    return datetime.fromordinal(day)
+
+
+def day_to_weekday(day: int) -> str:
+    # Ordinal 1 (01/01/0001) is a Monday
+    return WEEKDAYS[(day - 1) % 7]
+
 
 @dataclass
 class Campsite:
@@ -14,14 +42,43 @@ class Campsite:
 
 @dataclass
 class AvailableCampsite:
-    date: datetime
+    day: int
     campsite: Campsite
 
+    @property
+    def date(self) -> datetime:
+        return day_to_datetime(self.day)
+
     def __lt__(self, other: AvailableCampsite) -> bool:
-        return self.date < other.date
+        return self.day < other.day
 
     def __hash__(self) -> int:
-        return hash((self.date, self.campsite.campsite))
+        return hash((self.day, self.campsite.campsite))
+
+
+@dataclass
+class FailedFetch:
+    """A window of availability that could not be retrieved and should be retried."""
+
+    start_date: datetime
+    months: int
+    error: str
+    # Only connection-type errors are worth retrying before the next full check
+    retryable: bool = True
+
+    @classmethod
+    def from_exception(
+        cls, start_date: datetime, months: int, error: Exception
+    ) -> FailedFetch:
+        # requests' exceptions and the ConnectionError raised for bad status codes
+        # are both OSErrors
+        return cls(start_date, months, str(error), isinstance(error, OSError))
+
+
+@dataclass
+class FetchResult:
+    available: list[AvailableCampsite] = field(default_factory=list)
+    failed: list[FailedFetch] = field(default_factory=list)
 
 
 def filter_to_criteria(
@@ -33,43 +90,42 @@ def filter_to_criteria(
     calendar_dates: Optional[List[datetime]] = None,
     sub_campgrounds: Optional[List[str]] = None,
 ) -> list[AvailableCampsite]:
-    if require_same_site:
-        available_sites = [
-            (x, list(y))
-            for x, y in itertools.groupby(
-                all_available, key=lambda x: x.campsite.campsite
-            )
+    if sub_campgrounds:
+        all_available = [
+            x for x in all_available if x.campsite.campground in sub_campgrounds
         ]
+    if require_same_site:
+        grouped: defaultdict[str, list[AvailableCampsite]] = defaultdict(list)
+        for site in all_available:
+            grouped[site.campsite.campsite].append(site)
+        available_sites = list(grouped.values())
     else:
-        available_sites = [("All", all_available)]
+        available_sites = [all_available]
+    start_days = {x.toordinal() for x in calendar_dates} if calendar_dates else set()
+    weekday_set = set(weekdays)
     passes_criteria: list[AvailableCampsite] = []
-    dates = [x.date() for x in calendar_dates] if calendar_dates else []
-    for _, sites_available in available_sites:
-        sites_available = sorted(sites_available)
-        if sub_campgrounds:
-            sites_available = [
-                x for x in sites_available if x.campsite.campground in sub_campgrounds
-            ]
-        date_groups = itertools.groupby(sites_available, key=lambda x: x.date)
-        if dates:
-            matches = [x for x, _ in date_groups if x.date() in dates]
+    for sites_available in available_sites:
+        by_day: defaultdict[int, list[AvailableCampsite]] = defaultdict(list)
+        for site in sites_available:
+            by_day[site.day].append(site)
+        if start_days:
+            matches = [x for x in by_day if x in start_days]
         else:
-            matches = [x for x, _ in date_groups if x.strftime("%A") in weekdays]
-        for match_date in matches:
+            matches = [x for x in by_day if day_to_weekday(x) in weekday_set]
+        for match_day in sorted(matches):
             all_nights_available = True
             available: list[AvailableCampsite] = []
-            for _ in range(nights):
+            for night in range(match_day, match_day + nights):
                 night_availability = [
                     x
-                    for x in sites_available
-                    if x.date == match_date and x.campsite.campsite not in ignore
+                    for x in by_day.get(night, [])
+                    if x.campsite.campsite not in ignore
                 ]
                 if not night_availability:
                     all_nights_available = False
                     break
                 else:
                     available.extend(night_availability)
-                match_date += timedelta(days=1)
             if all_nights_available:
                 passes_criteria.extend(available)
     # Remove duplicates if there are any
@@ -77,14 +133,14 @@ def filter_to_criteria(
 
 
 def get_table_data(available_sites: list[AvailableCampsite]) -> list[dict[str, str]]:
-    sorted_sites = sorted(available_sites, key=lambda x: (x.date, x.campsite.campsite))
+    sorted_sites = sorted(available_sites, key=lambda x: (x.day, x.campsite.campsite))
     all_data: list[dict[str, str]] = []
     for available_site in sorted_sites:
         data = {
             "campground": available_site.campsite.campground,
             "campsite": available_site.campsite.campsite,
             "date": available_site.date.strftime("%m/%d/%y"),
-            "weekday": available_site.date.strftime("%A"),
+            "weekday": day_to_weekday(available_site.day),
         }
         all_data.append(data)
     return all_data
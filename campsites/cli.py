@@ -1,12 +1,20 @@
+import dataclasses
 import logging
 import time
-from collections import defaultdict
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Callable, Set
+from typing import Callable, Optional
 
 import click
 
-from campsites.campsite import filter_to_criteria, get_table_data
+from campsites.cache import BoundedCache, create_stats_string, set_memory_budget
+from campsites.campsite import (
+    AvailableCampsite,
+    FailedFetch,
+    FetchResult,
+    filter_to_criteria,
+    get_table_data,
+)
 from campsites.messaging import send_message
 from campsites.recreation_gov import (
     get_campground_id,
@@ -23,6 +31,25 @@ import dotenv
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+ONE_DAY_SECONDS = 24 * 60 * 60
+API_FUNCTIONS: dict[str, tuple[Callable[[str], str], Callable[..., FetchResult]]] = {
+    "recreation.gov": (rg_get_campground_url, rg_get_all_available_campsites),
+    "reservecalifornia": (rc_get_campground_url, rc_get_all_available_campsites),
+}
+
+
+@dataclass
+class PendingFetch:
+    """A failed unit of a campground's availability waiting to be retried.
+
+    `campground_id` is empty when looking up the campground itself failed.
+    """
+
+    campground: str
+    campground_id: str
+    api: str
+    unit: FailedFetch
+
 
 def create_table_string(data: list[dict[str, str]]) -> str:
     header = list(data[0].keys())
@@ -47,22 +74,280 @@ def create_log(
 
 
 def log_and_notify_error_message(
-    message: str, error: str, check_every: int, notified_errors: defaultdict[str, int]
+    message: str,
+    error: str,
+    retry_in: str,
+    notified_errors: BoundedCache[str, int],
 ) -> None:
-    error_message = (
-        f"{message} Trying again in {check_every} minutes.\nError: {error}\n"
-    )
+    error_message = f"{message} Trying again in {retry_in}.\nError: {error}\n"
     logger.error(error_message)
-    if error_message not in notified_errors:
+    try:
+        count = (notified_errors.get(error_message) or 0) + 1
+        notified_errors.set(error_message, count)
+        # If 3 of the same errors are observed in the same day, send a notification.
+        if count == 3:
+            send_message(error_message)
+    except Exception:
+        pass
+
+
+def find_campground_id(campground: str, api: str) -> Optional[str]:
+    """Look up the campground ID, returning None if it cannot be found at all."""
+    if api == "reservecalifornia":
+        return campground
+    try:
+        return get_campground_id(campground)
+    except ValueError as e:
+        logger.info(
+            "Campsite not found in recreation.gov, trying reserve california..."
+        )
         try:
-            notified_errors[error_message] += 1
-            # If 3 of the same errors are observed in the same day, send a notification.
-            if notified_errors[error_message] >= 3:
-                send_message(error_message)
+            facility_id_table = create_table_string(get_facility_ids(campground))
+            logger.info(
+                "Found campsite with reserve california. Use --api reservecalifornia with -c and a facility ID below"
+            )
+            print(f"\n{facility_id_table}\n")
         except Exception:
-            pass
+            logger.error(str(e))
+        return None
+
+
+def fetch_availability(
+    campground: str,
+    campground_id: str,
+    get_all_available_campsites: Callable[..., FetchResult],
+    start_date: datetime,
+    months: int,
+) -> tuple[str, FetchResult]:
+    """Fetch availability, looking up the campground first if that failed before.
+
+    Any error becomes a failed unit so that one bad response cannot stop the
+    watcher. A campground that is not found is not retried.
+    """
+    try:
+        if not campground_id:
+            campground_id = get_campground_id(campground)
+        result = get_all_available_campsites(
+            campground_id=campground_id, start_date=start_date, months=months
+        )
+    except Exception as e:
+        result = FetchResult(failed=[FailedFetch.from_exception(start_date, months, e)])
+    return campground_id, result
+
+
+@dataclass
+class Watcher:
+    """Checks campgrounds against the search criteria and notifies about new hits.
+
+    Holds the long-lived state of a watch, so a single instance is reused for every
+    campground and every cycle.
+    """
+
+    weekdays: list[str]
+    nights: int
+    require_same_site: bool
+    ignore: list[str]
+    sub_campgrounds: list[str]
+    notify: bool
+    check_every: int
+    retry_every: int
+    send_message: Callable[[str], None] = send_message
+    calendar_dates: list[datetime] = field(default_factory=list)
+    # Keyed by (campground, hash of available campsite)
+    notified: BoundedCache[tuple[str, int], bool] = field(
+        default_factory=lambda: BoundedCache("notified", max_entries=100_000)
+    )
+    # Keyed by full error message, counts occurrences in the day since it was first
+    # seen
+    notified_errors: BoundedCache[str, int] = field(
+        default_factory=lambda: BoundedCache(
+            "notified_errors",
+            max_entries=1_000,
+            ttl=ONE_DAY_SECONDS,
+            refresh_ttl=False,
+        )
+    )
+
+    def filter_to_criteria(
+        self, all_available: list[AvailableCampsite]
+    ) -> list[AvailableCampsite]:
+        return filter_to_criteria(
+            all_available,
+            weekdays=self.weekdays,
+            nights=self.nights,
+            ignore=self.ignore,
+            require_same_site=self.require_same_site,
+            calendar_dates=self.calendar_dates,
+            sub_campgrounds=self.sub_campgrounds,
+        )
+
+    def report_availability(
+        self,
+        campground: str,
+        campground_id: str,
+        get_campground_url: Callable[[str], str],
+        all_available: list[AvailableCampsite],
+    ) -> None:
+        available = self.filter_to_criteria(all_available)
+        if not available:
+            logger.info(
+                f"No availability found for {campground} :( "
+                f"Trying again in {self.check_every} minutes."
+            )
+            return
+        table_data = get_table_data(available)
+        log_message = create_log(table_data, campground_id, get_campground_url)
+        logger.info(log_message)
+        available_not_notified = [
+            x for x in available if (campground, hash(x)) not in self.notified
+        ]
+        # Only notify if we have not sent a notification yet today
+        if self.notify and available_not_notified:
+            # Keep email concise by limiting the table size
+            email_message = create_log(
+                table_data[0:2], campground_id, get_campground_url
+            )
+            try:
+                self.send_message(email_message)
+            except Exception as e:
+                log_and_notify_error_message(
+                    message="Failed to retrieve availability.",
+                    error=str(e),
+                    retry_in=f"{self.check_every} minutes",
+                    notified_errors=self.notified_errors,
+                )
+                return
+            for x in available_not_notified:
+                self.notified.set((campground, hash(x)), True)
+
+    def queue_failed_units(
+        self,
+        campground: str,
+        campground_id: str,
+        api: str,
+        units: list[FailedFetch],
+        count: bool = True,
+    ) -> list[PendingFetch]:
+        """Log failed units and return the ones worth retrying before the next check.
+
+        Retries pass `count=False` so that a short outage does not reach the daily
+        notification threshold.
+        """
+        for unit in units:
+            message = (
+                f"Failed to retrieve availability for {campground} "
+                f"({unit.months} month(s) from "
+                f"{unit.start_date.strftime('%m/%d/%Y')})."
+            )
+            retry_in = (
+                f"{self.retry_every} seconds"
+                if unit.retryable
+                else f"{self.check_every} minutes"
+            )
+            if count:
+                log_and_notify_error_message(
+                    message=message,
+                    error=unit.error,
+                    retry_in=retry_in,
+                    notified_errors=self.notified_errors,
+                )
+            else:
+                logger.error(
+                    f"{message} Trying again in {retry_in}.\nError: {unit.error}\n"
+                )
+        return [
+            PendingFetch(campground, campground_id, api, unit)
+            for unit in units
+            if unit.retryable
+        ]
+
+    def check_campground(
+        self,
+        campground: str,
+        campground_id: str,
+        api: str,
+        start_date: datetime,
+        months: int,
+    ) -> tuple[FetchResult, list[PendingFetch]]:
+        """Fetch and report a campground, returning the result and what to retry.
 
+        Whatever was retrieved is reported straight away rather than waiting on the
+        failed units.
+        """
+        get_campground_url, get_all_available_campsites = API_FUNCTIONS[api]
+        campground_id, result = fetch_availability(
+            campground, campground_id, get_all_available_campsites, start_date, months
+        )
+        pending = self.queue_failed_units(
+            campground, campground_id, api, result.failed
+        )
+        if result.available or not result.failed:
+            self.report_availability(
+                campground, campground_id, get_campground_url, result.available
+            )
+        return result, pending
 
+    def retry_failed_units(
+        self,
+        pending: list[PendingFetch],
+        retrieved: dict[str, list[AvailableCampsite]],
+        until: float,
+    ) -> list[PendingFetch]:
+        """Retry only the failed units on a short schedule until `until`.
+
+        Newly retrieved availability is merged with what the campground already has
+        so multi-night stays spanning a failed and a successful month are still
+        found, and each campground that gained availability is reported once per
+        round. Returns the units that are still waiting to be retried.
+        """
+        while pending and time.monotonic() + self.retry_every < until:
+            time.sleep(self.retry_every)
+            still_pending: list[PendingFetch] = []
+            updated: dict[str, PendingFetch] = {}
+            for x in pending:
+                get_campground_url, get_all_available_campsites = API_FUNCTIONS[x.api]
+                campground_id, result = fetch_availability(
+                    x.campground,
+                    x.campground_id,
+                    get_all_available_campsites,
+                    x.unit.start_date,
+                    x.unit.months,
+                )
+                x = dataclasses.replace(x, campground_id=campground_id)
+                still_pending.extend(
+                    self.queue_failed_units(
+                        x.campground, campground_id, x.api, result.failed, count=False
+                    )
+                )
+                if result.available:
+                    retrieved[x.campground].extend(result.available)
+                    updated[x.campground] = x
+            for campground, x in updated.items():
+                get_campground_url, _ = API_FUNCTIONS[x.api]
+                self.report_availability(
+                    campground,
+                    x.campground_id,
+                    get_campground_url,
+                    retrieved[campground],
+                )
+            pending = still_pending
+        return pending
+
+
+@click.option(
+    "--retry-every",
+    help="Seconds to wait before retrying months or campgrounds that failed",
+    type=int,
+    default=30,
+    show_default=True,
+)
+@click.option(
+    "--memory-budget",
+    help="Megabytes of memory to allow for long-lived caches",
+    type=int,
+    default=16,
+    show_default=True,
+)
 @click.option(
     "--sub-campground",
     type=str,
@@ -166,6 +451,8 @@ def main(
     notify: bool,
     calendar_date: list[str],
     sub_campground: list[str],
+    memory_budget: int,
+    retry_every: int,
 ) -> None:
     """Search for campsite availability from recreation.gov or reservecalifornia.
 
@@ -188,114 +475,68 @@ def main(
 
     if nights < 1:
         raise ValueError("Nights must be greater than 1.")
+    if retry_every < 1:
+        raise ValueError("Retry every must be at least 1 second.")
     campgrounds = campground
-    notified: defaultdict[str, Set] = defaultdict(set)
-    notified_errors: defaultdict[str, int] = defaultdict(lambda: 0)
+    set_memory_budget(memory_budget * 1024 * 1024)
+    watcher = Watcher(
+        weekdays=day,
+        nights=nights,
+        require_same_site=require_same_site,
+        ignore=ignore,
+        sub_campgrounds=sub_campground,
+        notify=notify,
+        check_every=check_every,
+        retry_every=retry_every,
+    )
     while True:
+        cycle_start = time.monotonic()
         start_date = datetime.today()
         if calendar_date:
             start_date = datetime.strptime(calendar_date[0], "%m/%d/%Y")  # type: ignore
-            dates = [datetime.strptime(x, "%m/%d/%Y") for x in calendar_date]  # type: ignore
-        else:
-            dates = []
+            watcher.calendar_dates = [
+                datetime.strptime(x, "%m/%d/%Y") for x in calendar_date  # type: ignore
+            ]
+        # Availability retrieved so far this cycle, kept when only part of a
+        # campground's window fails
+        retrieved: dict[str, list[AvailableCampsite]] = {}
+        pending: list[PendingFetch] = []
         for campground in campgrounds:
             if campground.isdigit() and api == "recreation.gov":
                 logger.error(
                     "Did you mean to use --api reservecalifornia? Campground IDs are only valid for that API."
                 )
                 return
-            if api == "reservecalifornia":
-                if not campground.isdigit():
-                    logger.info(
-                        "ReserveCalifornia must use facility ID. Searching for facility "
-                        + "IDs using provided `campground_id` (note: this must be the "
-                        + "park that the campground is in)"
-                    )
-                    facility_id_table = create_table_string(
-                        get_facility_ids(campground)
-                    )
-                    logger.info(f"Found facilities in park:\n\n{facility_id_table}\n")
-                    break
-
-                get_campground_url = rc_get_campground_url
-                get_all_available_campsites = rc_get_all_available_campsites
-            else:
-                get_campground_url = rg_get_campground_url
-                get_all_available_campsites = rg_get_all_available_campsites
-            try:
-                try:
-                    campground_id = (
-                        campground
-                        if api == "reservecalifornia"
-                        else get_campground_id(campground)
-                    )
-                except ValueError as e:
-                    logger.info(
-                        "Campsite not found in recreation.gov, trying reserve california..."
-                    )
-                    try:
-                        facility_id_table = create_table_string(
-                            get_facility_ids(campground)
-                        )
-                        logger.info(
-                            "Found campsite with reserve california. Use --api reservecalifornia with -c and a facility ID below"
-                        )
-                        print(f"\n{facility_id_table}\n")
-                        return
-                    except Exception:
-                        logger.error(str(e))
-                        return
-                available = get_all_available_campsites(
-                    campground_id=campground_id, start_date=start_date, months=months
+            if api == "reservecalifornia" and not campground.isdigit():
+                logger.info(
+                    "ReserveCalifornia must use facility ID. Searching for facility "
+                    + "IDs using provided `campground_id` (note: this must be the "
+                    + "park that the campground is in)"
                 )
+                facility_id_table = create_table_string(get_facility_ids(campground))
+                logger.info(f"Found facilities in park:\n\n{facility_id_table}\n")
+                break
+            try:
+                campground_id = find_campground_id(campground, api)
             except Exception as e:
-                log_and_notify_error_message(
-                    message="Failed to retrieve availability.",
-                    error=str(e),
-                    check_every=check_every,
-                    notified_errors=notified_errors,
-                )
+                # Queued with an empty ID so only a retry repeats the lookup
+                unit = FailedFetch.from_exception(start_date, months, e)
+                retrieved[campground] = []
+                pending.extend(watcher.queue_failed_units(campground, "", api, [unit]))
                 continue
-            available = filter_to_criteria(
-                available,
-                weekdays=day,
-                nights=nights,
-                ignore=ignore,
-                require_same_site=require_same_site,
-                calendar_dates=dates,
-                sub_campgrounds=sub_campground,
+            if campground_id is None:
+                return
+            result, failed = watcher.check_campground(
+                campground, campground_id, api, start_date, months
             )
-            if available:
-                table_data = get_table_data(available)
-                log_message = create_log(table_data, campground_id, get_campground_url)
-                logger.info(log_message)
-                available_not_notified = [
-                    x for x in available if hash(x) not in notified[campground]
-                ]
-                # Only notify if we have not sent a notification yet today
-                if notify and available_not_notified:
-                    # Keep email concise by limiting the table size
-                    email_message = create_log(
-                        table_data[0:2], campground_id, get_campground_url
-                    )
-                    try:
-                        send_message(email_message)
-                    except Exception as e:
-                        log_and_notify_error_message(
-                            message="Failed to retrieve availability.",
-                            error=str(e),
-                            check_every=check_every,
-                            notified_errors=notified_errors,
-                        )
-                        continue
-                    for x in available_not_notified:
-                        notified[campground].add(hash(x))
-            else:
-                logger.info(
-                    f"No availability found for {campground} :( "
-                    f"Trying again in {check_every} minutes."
-                )
-        time.sleep(60 * check_every)
+            retrieved[campground] = result.available
+            pending.extend(failed)
+
+        watcher.retry_failed_units(
+            pending, retrieved, until=cycle_start + 60 * check_every
+        )
+        logger.info(f"Cache stats:\n{create_stats_string()}\n")
+        time.sleep(max(cycle_start + 60 * check_every - time.monotonic(), 0))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,329 @@
+"""Drive many simulated watches against the mock availability server."""
+import itertools
+import logging
+import math
+import os
+import resource
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Optional
+
+import click
+
+from campsites import cli, recreation_gov, reserve_california
+from campsites.cache import create_stats_string, total_size_bytes
+from campsites.cli import Watcher, create_table_string
+from campsites.mock_server import (
+    MockConfig,
+    mock_server_options,
+    start_server_in_background,
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+WEEKDAYS = ["Friday", "Saturday"]
+SETUP_ATTEMPTS = 5
+
+
+@dataclass
+class Watch:
+    api: str
+    campground: str
+    campground_id: str
+
+
+@dataclass
+class LoadTestResults:
+    latencies: list[float] = field(default_factory=list)
+    errors: Counter = field(default_factory=Counter)
+    hits: int = 0
+    unrecovered: int = 0
+    notifications: int = 0
+    memory_samples: list[dict[str, str]] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record(
+        self, latency: float, hits: int, errors: list[str], unrecovered: int
+    ) -> None:
+        with self.lock:
+            self.latencies.append(latency)
+            self.hits += hits
+            self.unrecovered += unrecovered
+            for error in errors:
+                self.errors[error] += 1
+
+    def record_notification(self, message: str) -> None:
+        with self.lock:
+            self.notifications += 1
+
+
+def get_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak rather than current RSS, in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values: list[float], percent: float) -> float:
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def search_campground_id(query: str) -> str:
+    # Setup goes through the same simulated 429s and errors as the watches do
+    for attempt in range(SETUP_ATTEMPTS):
+        try:
+            return recreation_gov.get_campground_id(query)
+        except ConnectionError:
+            if attempt == SETUP_ATTEMPTS - 1:
+                raise
+            time.sleep(0.1 * 2**attempt)
+    raise AssertionError("unreachable")
+
+
+def create_watches(count: int, api: str) -> list[Watch]:
+    watches: list[Watch] = []
+    apis = ["recreation.gov", "reservecalifornia"] if api == "both" else [api]
+    for i, watch_api in zip(range(count), itertools.cycle(apis)):
+        if watch_api == "recreation.gov":
+            campground = f"Campground {i}"
+            campground_id = search_campground_id(campground)
+        else:
+            campground = campground_id = str(i)
+        watches.append(Watch(watch_api, campground, campground_id))
+    return watches
+
+
+def run_watch(
+    watch: Watch,
+    watcher: Watcher,
+    months: int,
+    retries: int,
+    results: LoadTestResults,
+) -> None:
+    """Run one cycle of the watcher's per-campground check, including retries."""
+    start = time.perf_counter()
+    hits = 0
+    unrecovered = 0
+    try:
+        result, pending = watcher.check_campground(
+            watch.campground, watch.campground_id, watch.api, datetime.today(), months
+        )
+        latency = time.perf_counter() - start
+        errors = [x.error[:72] for x in result.failed]
+        retrieved = {watch.campground: result.available}
+        # Leave room for `retries` rounds of retries
+        until = time.monotonic() + (retries + 0.5) * watcher.retry_every
+        unrecovered = len(result.failed) - len(pending)
+        unrecovered += len(watcher.retry_failed_units(pending, retrieved, until=until))
+        hits = len(watcher.filter_to_criteria(retrieved[watch.campground]))
+    except Exception as e:
+        # Recorded rather than raised so the worker thread keeps running
+        latency = time.perf_counter() - start
+        errors = [f"{type(e).__name__}: {str(e)[:60]}"]
+    results.record(latency, hits, errors, unrecovered)
+
+
+def sample_memory(
+    results: LoadTestResults, started: float, every: float, stop: threading.Event
+) -> None:
+    while True:
+        results.memory_samples.append(
+            {
+                "elapsed_s": f"{time.monotonic() - started:.0f}",
+                "rss_mb": f"{get_rss_bytes() / 1024 / 1024:.1f}",
+                "cache_kb": f"{total_size_bytes() / 1024:.1f}",
+                "cycles": str(len(results.latencies)),
+            }
+        )
+        if stop.wait(every):
+            return
+
+
+def create_report(results: LoadTestResults, elapsed: float) -> str:
+    latencies = results.latencies
+    errors = sum(results.errors.values())
+    summary = [
+        {
+            "cycles": str(len(latencies)),
+            "failed_units": str(errors),
+            "unrecovered": str(results.unrecovered),
+            "hits": str(results.hits),
+            "notifications": str(results.notifications),
+            "cycles_per_s": f"{len(latencies) / elapsed:.1f}",
+            "p50_ms": f"{percentile(latencies, 50) * 1000:.0f}",
+            "p90_ms": f"{percentile(latencies, 90) * 1000:.0f}",
+            "p99_ms": f"{percentile(latencies, 99) * 1000:.0f}",
+            "max_ms": f"{max(latencies, default=math.nan) * 1000:.0f}",
+        }
+    ]
+    report = f"Summary:\n\n{create_table_string(summary)}\n\n"
+    if results.errors:
+        error_data = [
+            {"error": error, "count": str(count)}
+            for error, count in results.errors.most_common()
+        ]
+        report += f"Errors:\n\n{create_table_string(error_data)}\n\n"
+    report += f"Memory:\n\n{create_table_string(results.memory_samples)}\n\n"
+    report += f"Cache stats:\n{create_stats_string()}\n"
+    return report
+
+
+@mock_server_options
+@click.option(
+    "--base-url",
+    help="Use an already running mock server instead of starting one in-process",
+    type=str,
+    default=None,
+)
+@click.option(
+    "--sample-every",
+    help="Seconds between memory samples",
+    type=float,
+    default=5,
+    show_default=True,
+)
+@click.option(
+    "--retries",
+    help="Rounds of retries for failed units in each cycle",
+    type=int,
+    default=2,
+    show_default=True,
+)
+@click.option(
+    "--retry-every",
+    help="Seconds to wait before retrying failed units",
+    type=int,
+    default=1,
+    show_default=True,
+)
+@click.option(
+    "-n",
+    "--nights",
+    help="Number of nights to stay",
+    type=int,
+    default=2,
+    show_default=True,
+)
+@click.option(
+    "-m",
+    "--months",
+    help="Number of months to search per watch",
+    type=int,
+    default=2,
+    show_default=True,
+)
+@click.option(
+    "--api",
+    help="Reservation API to simulate",
+    default="both",
+    show_default=True,
+    type=click.Choice(["both", "recreation.gov", "reservecalifornia"]),
+)
+@click.option(
+    "--concurrency",
+    help="Number of watches checked at the same time",
+    type=int,
+    default=32,
+    show_default=True,
+)
+@click.option(
+    "--duration",
+    help="Seconds to run for",
+    type=float,
+    default=60,
+    show_default=True,
+)
+@click.option(
+    "--watches",
+    help="Number of simulated watches",
+    type=int,
+    default=200,
+    show_default=True,
+)
+@click.command()
+def main(
+    watches: int,
+    duration: float,
+    concurrency: int,
+    api: str,
+    months: int,
+    nights: int,
+    sample_every: float,
+    retry_every: int,
+    retries: int,
+    base_url: Optional[str],
+    **kwargs: Any,
+) -> None:
+    """Load and soak test the watcher against a local mock availability server.
+
+    Note: when the mock server runs in-process its memory is included in the
+    reported RSS. Start it separately with `campsites-mock-server` and pass
+    --base-url to measure the watcher alone.
+    """
+    # The backends and watcher log every campground and failure, which drowns out
+    # the report. Failures are counted in the report instead.
+    logging.getLogger(recreation_gov.__name__).setLevel(logging.WARNING)
+    logging.getLogger(reserve_california.__name__).setLevel(logging.WARNING)
+    logging.getLogger(cli.__name__).setLevel(logging.CRITICAL)
+    server = None
+    if base_url is None:
+        server, base_url = start_server_in_background(MockConfig(**kwargs))
+        logger.info(f"Started mock availability server on {base_url}")
+    os.environ["RECREATION_GOV_BASE_URL"] = base_url
+    os.environ["RESERVE_CALIFORNIA_BASE_URL"] = base_url
+    all_watches = create_watches(watches, api)
+    logger.info(f"Running {len(all_watches)} watches for {duration:.0f} seconds...")
+
+    results = LoadTestResults()
+    # One watcher checks every campground, as find-campsites does with several -c
+    watcher = Watcher(
+        weekdays=WEEKDAYS,
+        nights=nights,
+        require_same_site=False,
+        ignore=[],
+        sub_campgrounds=[],
+        notify=True,
+        check_every=0,
+        retry_every=retry_every,
+        send_message=results.record_notification,
+    )
+    started = time.monotonic()
+    stop = threading.Event()
+    sampler = threading.Thread(
+        target=sample_memory, args=(results, started, sample_every, stop), daemon=True
+    )
+    sampler.start()
+    schedule = itertools.cycle(all_watches)
+    schedule_lock = threading.Lock()
+
+    def worker() -> None:
+        while time.monotonic() - started < duration:
+            with schedule_lock:
+                watch = next(schedule)
+            run_watch(watch, watcher, months, retries, results)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    elapsed = time.monotonic() - started
+    stop.set()
+    sampler.join()
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+    logger.info(f"Load test finished.\n\n{create_report(results, elapsed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""Local stand-in for the recreation.gov and ReserveCalifornia availability APIs.
+
+Point the CLI at it with:
+
+    RECREATION_GOV_BASE_URL=http://localhost:8000 \\
+    RESERVE_CALIFORNIA_BASE_URL=http://localhost:8000 find-campsites -c "Campground 1"
+"""
+import json
+import logging
+import random
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+import click
+from dateutil.relativedelta import relativedelta
+
+logging.basicConfig(
+    format="%(levelname)s\t%(asctime)s\t%(message)s", level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+RG_SEARCH_PATH = "/api/search"
+RG_AVAILABILITY_PATH = re.compile(r"^/api/camps/availability/campground/(\w+)/month$")
+RC_SEARCH_PATH = re.compile(r"^/rdr/fd/citypark/namecontains/(.*)$")
+RC_PLACE_PATH = "/rdr/search/place"
+RC_AVAILABILITY_PATH = "/rdr/search/grid"
+FACILITIES_PER_PLACE = 3
+
+
+@dataclass
+class MockConfig:
+    sites: int = 50
+    availability: float = 0.2
+    latency: float = 0.05
+    jitter: float = 0.02
+    error_rate: float = 0.0
+    rate_limit_every: int = 0
+    rate_limit_burst: int = 0
+    churn: float = 0.05
+    churn_interval: float = 60.0
+    seed: int = 0
+
+
+class MockState:
+    """Availability shared by both APIs.
+
+    Availability is a pure function of (campground, site, day, churn epoch), so the
+    server holds no per-site state no matter how long it runs.
+    """
+
+    def __init__(self, config: MockConfig) -> None:
+        self.config = config
+        self.requests = 0
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    def _roll(self, *values: int) -> float:
+        return (hash((self.config.seed,) + values) & 0xFFFFFFFF) / 0x100000000
+
+    def _current_epoch(self) -> int:
+        if self.config.churn <= 0 or self.config.churn_interval <= 0:
+            return 0
+        return int((time.monotonic() - self._started) // self.config.churn_interval)
+
+    def is_available(self, campground: str, site: int, day: date) -> bool:
+        cell = (zlib.crc32(campground.encode()), site, day.toordinal())
+        # Walk back to the most recent epoch in which this cell was re-rolled
+        epoch = self._current_epoch()
+        while epoch > 0 and self._roll(*cell, epoch, 1) >= self.config.churn:
+            epoch -= 1
+        return self._roll(*cell, epoch, 0) < self.config.availability
+
+    def simulate_upstream(self) -> Optional[int]:
+        """Return a status code to fail the request with, otherwise add latency."""
+        with self._lock:
+            self.requests += 1
+            count = self.requests
+            roll = self._random.random()
+            jitter = self._random.uniform(-self.config.jitter, self.config.jitter)
+        every = self.config.rate_limit_every
+        if every and count % every < self.config.rate_limit_burst:
+            return 429
+        if roll < self.config.error_rate:
+            return 500
+        delay = self.config.latency + jitter
+        if delay > 0:
+            time.sleep(delay)
+        return None
+
+
+def _days(start: date, end: date) -> list[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days)]
+
+
+def rg_search(query: str) -> dict[str, Any]:
+    campground_id = "".join(x for x in query if x.isdigit()) or str(len(query))
+    return {"entity_id": campground_id}
+
+
+def rg_availability(
+    state: MockState, campground_id: str, start_date: str
+) -> dict[str, Any]:
+    start = datetime.fromisoformat(start_date[:10]).date().replace(day=1)
+    days = _days(start, start + relativedelta(months=1))
+    campsites: dict[str, Any] = {}
+    for site in range(state.config.sites):
+        availabilities = {
+            f"{day.isoformat()}T00:00:00Z": (
+                "Available"
+                if state.is_available(campground_id, site, day)
+                else "Reserved"
+            )
+            for day in days
+        }
+        campsites[str(site)] = {
+            "availabilities": availabilities,
+            "campsite_id": str(site),
+            "site": f"{site:03d}",
+            "type_of_use": "Overnight",
+            "quantities": None,
+            "min_num_people": 1,
+            "max_num_people": 6,
+            "loop": f"Loop {site % 3}",
+            "capacity_rating": "Single",
+            "campsite_type": "STANDARD NONELECTRIC",
+            "campsite_reserve_type": "Site-Specific",
+        }
+    return {"campsites": campsites}
+
+
+def rc_search(query: str) -> list[dict[str, Any]]:
+    place_id = int("".join(x for x in query if x.isdigit()) or len(query))
+    return [{"Name": query, "PlaceId": place_id}]
+
+
+def rc_place(data: dict[str, Any]) -> dict[str, Any]:
+    place_id = int(data["PlaceId"])
+    facilities = {
+        str(facility_id): {
+            "Name": f"Facility {facility_id}",
+            "FacilityId": facility_id,
+        }
+        for facility_id in range(
+            place_id * FACILITIES_PER_PLACE, (place_id + 1) * FACILITIES_PER_PLACE
+        )
+    }
+    return {"SelectedPlace": {"Facilities": facilities}}
+
+
+def rc_availability(state: MockState, data: dict[str, Any]) -> dict[str, Any]:
+    facility_id = str(data["FacilityId"])
+    start = datetime.strptime(data["StartDate"], "%Y-%m-%d").date()
+    end = datetime.strptime(data["EndDate"], "%Y-%m-%d").date()
+    days = _days(start, end)
+    units: dict[str, Any] = {}
+    for site in range(state.config.sites):
+        slices = {
+            day.isoformat(): {
+                "Date": day.isoformat(),
+                "IsFree": state.is_available(facility_id, site, day),
+            }
+            for day in days
+        }
+        units[str(site)] = {
+            "UnitId": site,
+            "Name": f"Site {site:03d}",
+            "ShortName": f"{site:03d}",
+            "RecentPopups": 0,
+            "IsAda": False,
+            "AllowWebBooking": True,
+            "MapInfo": {},
+            "IsWebViewable": True,
+            "IsFiltered": False,
+            "UnitCategoryId": 1,
+            "SleepingUnitIds": [],
+            "UnitTypeGroupId": 1,
+            "UnitTypeId": 1,
+            "VehicleLength": 0,
+            "OrderBy": site,
+            "OrderByRaw": site,
+            "SliceCount": len(slices),
+            "AvailableCount": sum(x["IsFree"] for x in slices.values()),
+            "Slices": slices,
+        }
+    return {"Facility": {"Name": f"Facility {facility_id}", "Units": units}}
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    state: MockState
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, body: Any) -> None:
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _handle(self, route: Any) -> None:
+        failure = self.state.simulate_upstream()
+        if failure is not None:
+            self._send_json(failure, {"error": "Simulated failure"})
+            return
+        try:
+            body = route()
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        if body is None:
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        self._send_json(200, body)
+
+    def do_GET(self) -> None:
+        self._handle(self._route_get)
+
+    def do_POST(self) -> None:
+        self._handle(self._route_post)
+
+    def _route_get(self) -> Any:
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == RG_SEARCH_PATH:
+            return rg_search(params["q"])
+        match = RG_AVAILABILITY_PATH.match(url.path)
+        if match:
+            return rg_availability(self.state, match.group(1), params["start_date"])
+        match = RC_SEARCH_PATH.match(url.path)
+        if match:
+            return rc_search(unquote(match.group(1)))
+        return None
+
+    def _route_post(self) -> Any:
+        length = int(self.headers.get("Content-Length", 0))
+        data = json.loads(self.rfile.read(length) or b"{}")
+        path = urlparse(self.path).path
+        if path == RC_PLACE_PATH:
+            return rc_place(data)
+        if path == RC_AVAILABILITY_PATH:
+            return rc_availability(self.state, data)
+        return None
+
+
+def create_server(
+    config: MockConfig, host: str = "localhost", port: int = 0
+) -> ThreadingHTTPServer:
+    """Create (but do not start) a mock server. Use port 0 for a free port."""
+    handler = type(
+        "BoundMockRequestHandler", (MockRequestHandler,), {"state": MockState(config)}
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_server_in_background(
+    config: MockConfig, host: str = "localhost", port: int = 0
+) -> tuple[ThreadingHTTPServer, str]:
+    server = create_server(config, host, port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def mock_server_options(func: Any) -> Any:
+    """Options shared by the mock server and the load test harness."""
+    # Options are added to an already created command, so they are listed in the
+    # order applied
+    options = [
+        click.option(
+            "--sites",
+            help="Number of campsites per campground",
+            type=int,
+            default=MockConfig.sites,
+            show_default=True,
+        ),
+        click.option(
+            "--availability",
+            help="Probability that a campsite is available on a given day",
+            type=float,
+            default=MockConfig.availability,
+            show_default=True,
+        ),
+        click.option(
+            "--latency",
+            help="Seconds of latency added to every response",
+            type=float,
+            default=MockConfig.latency,
+            show_default=True,
+        ),
+        click.option(
+            "--jitter",
+            help="Maximum seconds of random latency jitter",
+            type=float,
+            default=MockConfig.jitter,
+            show_default=True,
+        ),
+        click.option(
+            "--error-rate",
+            help="Probability that a request fails with a 500",
+            type=float,
+            default=MockConfig.error_rate,
+            show_default=True,
+        ),
+        click.option(
+            "--rate-limit-every",
+            help="Start a burst of 429 responses every N requests (0 to disable)",
+            type=int,
+            default=MockConfig.rate_limit_every,
+            show_default=True,
+        ),
+        click.option(
+            "--rate-limit-burst",
+            help="Number of consecutive 429 responses in each burst",
+            type=int,
+            default=MockConfig.rate_limit_burst,
+            show_default=True,
+        ),
+        click.option(
+            "--churn",
+            help="Fraction of availability that flips every churn interval",
+            type=float,
+            default=MockConfig.churn,
+            show_default=True,
+        ),
+        click.option(
+            "--churn-interval",
+            help="Seconds between availability churn",
+            type=float,
+            default=MockConfig.churn_interval,
+            show_default=True,
+        ),
+        click.option(
+            "--seed",
+            help="Random seed",
+            type=int,
+            default=MockConfig.seed,
+            show_default=True,
+        ),
+    ]
+    for option in options:
+        func = option(func)
+    return func
+
+
+@click.option("--port", help="Port to listen on", type=int, default=8000)
+@click.option("--host", help="Host to listen on", type=str, default="localhost")
+@mock_server_options
+@click.command()
+def main(host: str, port: int, **kwargs: Any) -> None:
+    """Serve a local stand-in for the recreation.gov and reservecalifornia APIs."""
+    server = create_server(MockConfig(**kwargs), host, port)
+    logger.info(f"Mock availability server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
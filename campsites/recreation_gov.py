@@ -1,11 +1,19 @@
 import dataclasses
 import logging
+import os
 from dataclasses import dataclass
 from datetime import datetime
+from typing import Optional
 
 from dateutil.relativedelta import relativedelta
 
-from campsites.campsite import AvailableCampsite, Campsite
+from campsites.campsite import (
+    AvailableCampsite,
+    Campsite,
+    FailedFetch,
+    FetchResult,
+    date_string_to_day,
+)
 from campsites.common import make_get_request
 
 logging.basicConfig(
@@ -22,6 +30,11 @@ SEARCH_ENDPOINT = "/api/search"
 AVAILABILITY_ENDPOINT = "/api/camps/availability/campground/"
 
 
+def get_base_url() -> str:
+    # Read on every request so the override can point at a local mock server
+    return os.environ.get("RECREATION_GOV_BASE_URL", BASE_URL)
+
+
 @dataclass
 class RecreationGovCampsite:
     availabilities: dict[str, str]
@@ -36,19 +49,19 @@ class RecreationGovCampsite:
     campsite_type: str
     campsite_reserve_type: str
 
-    def get_availabilities(self) -> list[datetime]:
-        availabilities: list[datetime] = []
+    def get_availabilities(self) -> list[int]:
+        availabilities: list[int] = []
         for date_string, availability in self.availabilities.items():
             if availability in IS_AVAILABLE_KEYWORDS:
-                date = datetime.fromisoformat(date_string[:-1])
-                availabilities.append(date)
+                availabilities.append(date_string_to_day(date_string))
         return availabilities
 
     def to_campsite(self) -> Campsite:
         return Campsite(campground=self.loop, campsite=self.site)
 
 
-def get_campground_id(query: str, url: str = f"{BASE_URL}{SEARCH_ENDPOINT}") -> str:
+def get_campground_id(query: str, url: Optional[str] = None) -> str:
+    url = url or f"{get_base_url()}{SEARCH_ENDPOINT}"
     params = {"q": query}
     campground_data = make_get_request(url, params)
     if "entity_id" not in campground_data:
@@ -59,7 +72,7 @@ def get_campground_id(query: str, url: str = f"{BASE_URL}{SEARCH_ENDPOINT}") ->
 
 
 def rg_get_campground_url(campground_id: str) -> str:
-    return f"{BASE_URL}/camping/campgrounds/{campground_id}"
+    return f"{get_base_url()}/camping/campgrounds/{campground_id}"
 
 
 def convert_date_to_string(date: datetime) -> str:
@@ -70,39 +83,48 @@ def convert_date_to_string(date: datetime) -> str:
     return date_format
 
 
-def get_all_campsites(
-    campground_id: str,
-    start_date: datetime,
-    months: int,
+def get_month_campsites(
+    campground_id: str, month_start: datetime
 ) -> list[RecreationGovCampsite]:
-    all_sites: list[RecreationGovCampsite] = []
     field_names = [x.name for x in dataclasses.fields(RecreationGovCampsite)]
-    for _ in range(months):
-        date_string = convert_date_to_string(start_date)
-        params = {"start_date": date_string}
-        url = f"{BASE_URL}{AVAILABILITY_ENDPOINT}{campground_id}/month?"
-        # url = f"{BASE_URL}/camps/availability/campground/{campground_id}/month?"
-        data = make_get_request(url, params)
-        for site in data["campsites"].values():
-            site_data = {field: site[field] for field in field_names}
-            all_sites.append(RecreationGovCampsite(**site_data))
-        start_date = start_date + relativedelta(months=1)
-    return all_sites
-
-
-def rg_get_all_available_campsites(
-    campground_id: str, start_date: datetime, months: int
+    date_string = convert_date_to_string(month_start)
+    params = {"start_date": date_string}
+    url = f"{get_base_url()}{AVAILABILITY_ENDPOINT}{campground_id}/month?"
+    data = make_get_request(url, params)
+    return [
+        RecreationGovCampsite(**{field: site[field] for field in field_names})
+        for site in data["campsites"].values()
+    ]
+
+
+def to_available_campsites(
+    campsites: list[RecreationGovCampsite],
 ) -> list[AvailableCampsite]:
     results: list[AvailableCampsite] = []
-    campsites = get_all_campsites(
-        campground_id=campground_id, start_date=start_date, months=months
-    )
     for campsite in campsites:
         # We exclude picnic sites from the mix
         if campsite.type_of_use == "Day":
             continue
         availabilities = campsite.get_availabilities()
         if availabilities:
-            for date in availabilities:
-                results.append(AvailableCampsite(date, campsite.to_campsite()))
+            for day in availabilities:
+                results.append(AvailableCampsite(day, campsite.to_campsite()))
     return results
+
+
+def rg_get_all_available_campsites(
+    campground_id: str, start_date: datetime, months: int
+) -> FetchResult:
+    """Fetch each month separately so one failed month does not lose the others.
+
+    Errors parsing a month's response fail that month too.
+    """
+    result = FetchResult()
+    for _ in range(months):
+        try:
+            campsites = get_month_campsites(campground_id, start_date)
+            result.available.extend(to_available_campsites(campsites))
+        except Exception as e:
+            result.failed.append(FailedFetch.from_exception(start_date, 1, e))
+        start_date = start_date + relativedelta(months=1)
+    return result
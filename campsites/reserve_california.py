@@ -1,13 +1,20 @@
 import dataclasses
 import logging
+import os
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any
+from typing import Any, Optional
 
 import requests
 from dateutil.relativedelta import relativedelta
 
-from campsites.campsite import AvailableCampsite, Campsite
+from campsites.campsite import (
+    AvailableCampsite,
+    Campsite,
+    FailedFetch,
+    FetchResult,
+    date_string_to_day,
+)
 from campsites.common import make_get_request, make_post_request
 
 logging.basicConfig(
@@ -23,6 +30,10 @@ AVAILABILITY_ENDPOINT = "/rdr/search/grid"
 CAMPGROUND_URL = "https://www.reservecalifornia.com/"
 
 
+def get_base_url() -> str:
+    return os.environ.get("RESERVE_CALIFORNIA_BASE_URL", BASE_URL)
+
+
 @dataclass
 class ReserveCaliforniaCampsite:
     Campground: str
@@ -46,20 +57,19 @@ class ReserveCaliforniaCampsite:
     AvailableCount: int
     Slices: dict[str, Any]
 
-    def get_availabilities(self) -> list[datetime]:
-        availabilities: list[datetime] = []
+    def get_availabilities(self) -> list[int]:
+        availabilities: list[int] = []
         for campsite in self.Slices.values():
             if campsite["IsFree"]:
-                date_string = campsite["Date"]
-                date = datetime.strptime(date_string, "%Y-%m-%d")
-                availabilities.append(date)
+                availabilities.append(date_string_to_day(campsite["Date"]))
         return availabilities
 
     def to_campsite(self) -> Campsite:
         return Campsite(campground=self.Campground, campsite=self.Name)
 
 
-def get_campground_id(query: str, url: str = f"{BASE_URL}{SEARCH_ENDPOINT}") -> str:
+def get_campground_id(query: str, url: Optional[str] = None) -> str:
+    url = url or f"{get_base_url()}{SEARCH_ENDPOINT}"
     url_with_query = f"{url}{requests.utils.quote(query)}"  # type: ignore
     response = make_get_request(url_with_query)
     if not response:
@@ -72,8 +82,9 @@ def get_campground_id(query: str, url: str = f"{BASE_URL}{SEARCH_ENDPOINT}") ->
 
 
 def get_facility_ids(
-    campground: str, url: str = f"{BASE_URL}{PLACE_ENDPOINT}"
+    campground: str, url: Optional[str] = None
 ) -> list[dict[str, str]]:
+    url = url or f"{get_base_url()}{PLACE_ENDPOINT}"
     campground_id = get_campground_id(campground)
     data = {
         "PlaceId": campground_id,
@@ -104,7 +115,7 @@ def get_all_campsites(
         "StartDate": start_date.strftime(DATE_FORMAT),
         "EndDate": (start_date + relativedelta(months=months)).strftime(DATE_FORMAT),
     }
-    url = f"{BASE_URL}{AVAILABILITY_ENDPOINT}"
+    url = f"{get_base_url()}{AVAILABILITY_ENDPOINT}"
     response = make_post_request(url, data)
     campground = response["Facility"]["Name"]
     if not campground:
@@ -122,17 +133,19 @@ def get_all_campsites(
 
 def rc_get_all_available_campsites(
     campground_id: str, start_date: datetime, months: int
-) -> list[AvailableCampsite]:
-    results: list[AvailableCampsite] = []
-    campsites = get_all_campsites(
-        campground_id=campground_id, start_date=start_date, months=months
-    )
-    for campsite in campsites:
-        availabilities = campsite.get_availabilities()
-        if availabilities:
-            for date in availabilities:
-                results.append(AvailableCampsite(date, campsite.to_campsite()))
-    return results
+) -> FetchResult:
+    """The whole window comes back in a single request, so it fails as one unit."""
+    available: list[AvailableCampsite] = []
+    try:
+        campsites = get_all_campsites(
+            campground_id=campground_id, start_date=start_date, months=months
+        )
+        for campsite in campsites:
+            for day in campsite.get_availabilities():
+                available.append(AvailableCampsite(day, campsite.to_campsite()))
+    except Exception as e:
+        return FetchResult(failed=[FailedFetch.from_exception(start_date, months, e)])
+    return FetchResult(available=available)
 
 
 def rc_get_campground_url(campground_id: str) -> str: